@@ -251,7 +251,17 @@ def simplify_meta(meta_raw: Dict[str, Any]) -> Dict[str, Any]:
 def get_prices(function: str,
                symbol: str,
                interval: Optional[str] = None) -> Dict[str, Any]:
-    
+    _, data = get_prices_with_stamp(function=function, symbol=symbol, interval=interval)
+    return data
+
+
+# same as get_prices but also returns when the underlying payload was fetched,
+# so callers can memoize anything derived from it until the series refreshes
+
+def get_prices_with_stamp(function: str,
+                          symbol: str,
+                          interval: Optional[str] = None) -> Tuple[datetime, Dict[str, Any]]:
+
     if function == "TIME_SERIES_INTRADAY" and not interval:
         raise ValueError("for intraday requests, pass an interval value like '1min','5min','15min','30min','60min'")
 
@@ -265,7 +275,7 @@ def get_prices(function: str,
                 # guard: only parse proper time series payloads
                 if isinstance(payload, dict) and "Meta Data" in payload:
                     meta, rows = parse_time_series(payload)
-                    return {"meta": meta, "rows": rows}
+                    return ts, {"meta": meta, "rows": rows}
                 # otherwise fall through and refetch
     # ------------------------------------
 
@@ -275,13 +285,32 @@ def get_prices(function: str,
     if not isinstance(payload, dict) or "Meta Data" not in payload:
         raise RuntimeError("Upstream returned non-time-series JSON (rate limit or invalid request).")
 
+    fetched_at = datetime.utcnow()
+
     # --- cache store ---
     if CACHE_TTL_SEC > 0:
-        _cache[(function, symbol, interval)] = (datetime.utcnow(), payload)
+        _cache[(function, symbol, interval)] = (fetched_at, payload)
     # ---------------------------
 
     meta, rows = parse_time_series(payload)
-    return {"meta": meta, "rows": rows}
+    return fetched_at, {"meta": meta, "rows": rows}
+
+
+def cached_stamp(function: str,
+                 symbol: str,
+                 interval: Optional[str] = None) -> Optional[datetime]:
+    # fetch time of a still-fresh cached payload, or None if a call would go upstream
+    if CACHE_TTL_SEC <= 0:
+        return None
+    hit = _cache.get((function, symbol, interval))
+    if not hit:
+        return None
+    ts, payload = hit
+    if datetime.utcnow() - ts >= timedelta(seconds=CACHE_TTL_SEC):
+        return None
+    if not (isinstance(payload, dict) and "Meta Data" in payload):
+        return None
+    return ts
 
 
 # main function for testing/demos, run file to use
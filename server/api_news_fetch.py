@@ -1,10 +1,15 @@
 # api_news_fetch.py
 
+import re
 import requests
+import threading
 import time
-from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 from collections import deque
+from psycopg2.extras import execute_values
+
+from server.database import get_db_connection
 
 API_KEYS = [
     "MMK62Q0AQU1ENXDT",
@@ -14,15 +19,31 @@ API_KEYS = [
     "C5R9TNCMFVS2BSWY"
 ]
 
-#caches setup to avoid hitting limits
+# articles live in postgres (see database.init_db), keyed by url and indexed
+# by ticker + topic. a feed is only pulled from AV again once it is older than
+# this, and then only for articles newer than what we already have (time_from)
 CACHE_TTL_SEC = 1800  # 30 mins
-_cache: Dict[str, tuple[datetime, List[Dict[str, Any]]]] = {}
+FETCH_LIMIT = 1000  # max AV allows per NEWS_SENTIMENT call, keep everything
+RETRY_AFTER_FAIL_SEC = 300  # after AV refuses a refresh, wait this long before asking again
+MAX_TICKERS = 10  # tickers accepted per /api/news request
+MAX_REFRESH_PER_REQUEST = 3  # upstream calls one request may make, stays under the per-key gate
+COVERED_TTL_MULT = 4  # a ticker's own feed is pulled at least every CACHE_TTL_SEC * this
+GENERAL_TOPIC = "financial_markets"
+_feed_locks: Dict[str, threading.Lock] = {}
+_feed_locks_guard = threading.Lock()
 
 # per-key rate limiter
 MAX_CALLS_PER_MIN = 4
 _RATE_WINDOW: Dict[str, deque] = {k: deque() for k in API_KEYS}
 _MINUTE_WINDOW_SEC = 60
 
+AV_TIME_FMT = "%Y%m%dT%H%M%S"
+AV_TIME_FROM_FMT = "%Y%m%dT%H%M"
+
+class NewsFetchError(RuntimeError):
+    # every key failed or was throttled, the store may still have articles
+    pass
+
 def _rate_gate_allow(key: str):
     q = _RATE_WINDOW.setdefault(key, deque())
     now = time.time()
@@ -34,7 +55,9 @@ def _rate_gate_allow(key: str):
         time.sleep(wait)
     q.append(time.time())
 
-def _fetch_from_api(ticker: Optional[str] = None) -> List[Dict[str, Any]]:
+def _fetch_from_api(ticker: Optional[str] = None,
+                    time_from: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    # returns the raw AV feed items, nothing is dropped here
     base = "https://www.alphavantage.co/query"
     key_iter = API_KEYS
     last_err = None
@@ -44,11 +67,15 @@ def _fetch_from_api(ticker: Optional[str] = None) -> List[Dict[str, Any]]:
         params = {
             "function": "NEWS_SENTIMENT",
             "apikey": key,
+            "sort": "LATEST",
+            "limit": FETCH_LIMIT,
         }
         if ticker:
             params["tickers"] = ticker
         else:
-            params["topics"] = "financial_markets"
+            params["topics"] = GENERAL_TOPIC
+        if time_from:
+            params["time_from"] = time_from.strftime(AV_TIME_FROM_FMT)
 
         try:
             r = requests.get(base, params=params, timeout=10)
@@ -62,36 +89,339 @@ def _fetch_from_api(ticker: Optional[str] = None) -> List[Dict[str, Any]]:
                     continue
                 raise RuntimeError(f"Unexpected payload: {data}")
 
-            feed = data["feed"]
-            articles = []
-            for item in feed[:10]:  # limit to 10 articles
-                articles.append({
-                    "title": item.get("title"),
-                    "summary": item.get("summary"),
-                    "url": item.get("url"),
-                    "source": item.get("source"),
-                    "time_published": item.get("time_published"),
-                    "sentiment": item.get("overall_sentiment_label")
-                })
-            print(f"[INFO] Success with key ending ...{key[-4:]}")
-            return articles
+            print(f"[INFO] Success with key ending ...{key[-4:]} ({len(data['feed'])} articles)")
+            return data["feed"]
 
         except Exception as e:
             last_err = e
             print(f"[WARN] Key {key[-4:]} failed: {e}")
             continue
 
-    raise RuntimeError(f"All API keys failed: {last_err}")
+    raise NewsFetchError(f"All API keys failed: {last_err}")
+
+
+# ---------- parsing AV feed items ----------
+
+def _to_float(v: Any) -> Optional[float]:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_published(v: Optional[str]) -> Optional[datetime]:
+    if not v:
+        return None
+    try:
+        return datetime.strptime(v, AV_TIME_FMT)
+    except ValueError:
+        return None
+
+def _topic_key(topic: str) -> str:
+    # AV feed says "Financial Markets", the query param is "financial_markets"
+    return re.sub(r"[^a-z0-9]+", "_", topic.lower()).strip("_")
+
+def _normalize_ticker(ticker: str) -> str:
+    return ticker.strip().upper()
+
+
+# ---------- news store ----------
+
+def _store_articles(cur, feed: List[Dict[str, Any]]) -> Optional[datetime]:
+    # upsert articles + their ticker/topic index rows, returns newest publish time
+    articles, tickers, topics = {}, {}, {}
+    latest = None
+
+    for item in feed:
+        url = item.get("url")
+        if not url:
+            continue
+        published = _parse_published(item.get("time_published"))
+        if published and (latest is None or published > latest):
+            latest = published
+
+        articles[url] = (
+            url,
+            item.get("title"),
+            item.get("summary"),
+            item.get("source"),
+            item.get("banner_image"),
+            published,
+            _to_float(item.get("overall_sentiment_score")),
+            item.get("overall_sentiment_label"),
+        )
+        for ts in item.get("ticker_sentiment") or []:
+            sym = ts.get("ticker")
+            if not sym:
+                continue
+            sym = _normalize_ticker(sym)
+            tickers[(url, sym)] = (
+                url,
+                sym,
+                _to_float(ts.get("relevance_score")),
+                _to_float(ts.get("ticker_sentiment_score")),
+                ts.get("ticker_sentiment_label"),
+            )
+        for tp in item.get("topics") or []:
+            name = tp.get("topic")
+            if not name:
+                continue
+            key = _topic_key(name)
+            topics[(url, key)] = (url, key, _to_float(tp.get("relevance_score")))
+
+    if articles:
+        execute_values(
+            cur,
+            """
+            INSERT INTO news_articles (url, title, summary, source, banner_image,
+                                       time_published, overall_sentiment_score,
+                                       overall_sentiment_label)
+            VALUES %s
+            ON CONFLICT (url) DO UPDATE SET
+                title = EXCLUDED.title,
+                summary = EXCLUDED.summary,
+                source = EXCLUDED.source,
+                banner_image = EXCLUDED.banner_image,
+                time_published = EXCLUDED.time_published,
+                overall_sentiment_score = EXCLUDED.overall_sentiment_score,
+                overall_sentiment_label = EXCLUDED.overall_sentiment_label,
+                fetched_at = NOW()
+            """,
+            list(articles.values()),
+        )
+    if tickers:
+        execute_values(
+            cur,
+            """
+            INSERT INTO news_article_tickers (url, ticker, relevance_score,
+                                              sentiment_score, sentiment_label)
+            VALUES %s
+            ON CONFLICT (url, ticker) DO UPDATE SET
+                relevance_score = EXCLUDED.relevance_score,
+                sentiment_score = EXCLUDED.sentiment_score,
+                sentiment_label = EXCLUDED.sentiment_label
+            """,
+            list(tickers.values()),
+        )
+    if topics:
+        execute_values(
+            cur,
+            """
+            INSERT INTO news_article_topics (url, topic, relevance_score)
+            VALUES %s
+            ON CONFLICT (url, topic) DO UPDATE SET
+                relevance_score = EXCLUDED.relevance_score
+            """,
+            list(topics.values()),
+        )
+    return latest
+
+def _feed_lock(feed_key: str) -> threading.Lock:
+    with _feed_locks_guard:
+        return _feed_locks.setdefault(feed_key, threading.Lock())
+
+def _refresh_feed(ticker: Optional[str] = None) -> bool:
+    # pull a feed from AV if it is stale, only asking for articles since the last pull.
+    # returns True when an upstream call was made (whether or not it worked).
+    # freshness is compared against NOW() in postgres, same clock as fetched_at
+    feed_key = f"ticker:{ticker}" if ticker else f"topic:{GENERAL_TOPIC}"
+
+    with _feed_lock(feed_key):
+        conn = get_db_connection()
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        SELECT latest_published,
+                               NOW() - last_fetched < make_interval(secs => %s) AS fresh,
+                               NOW() - last_fetched < make_interval(secs => %s) AS coverable
+                        FROM news_feeds WHERE feed_key = %s
+                        """,
+                        (CACHE_TTL_SEC, CACHE_TTL_SEC * COVERED_TTL_MULT, feed_key),
+                    )
+                    state = cur.fetchone()
+                    has_articles = bool(state and state["latest_published"] is not None)
+                    fresh = bool(state and state["fresh"])
 
-def get_news(ticker: Optional[str] = None) -> List[Dict[str, Any]]:
-    cache_key = ticker or "general"
-    hit = _cache.get(cache_key)
-    if hit:
-        ts, payload = hit
-        if datetime.utcnow() - ts < timedelta(seconds=CACHE_TTL_SEC):
-            print("[CACHE] Returning cached news")
-            return payload
+                    # a ticker whose own feed has been pulled before can ride on other
+                    # feeds' recent articles for a while, but not past COVERED_TTL_MULT
+                    if ticker and not fresh and has_articles and state["coverable"]:
+                        cur.execute(
+                            """
+                            SELECT EXISTS (
+                                SELECT 1 FROM news_article_tickers t
+                                JOIN news_articles a ON a.url = t.url
+                                WHERE t.ticker = %s
+                                  AND a.fetched_at > NOW() - make_interval(secs => %s)
+                            ) AS covered
+                            """,
+                            (ticker, CACHE_TTL_SEC),
+                        )
+                        fresh = cur.fetchone()["covered"]
+        finally:
+            conn.close()
+
+        if fresh:
+            print(f"[CACHE] {feed_key} is fresh, serving from store")
+            return False
+
+        time_from = state["latest_published"] if state else None
+        try:
+            feed = _fetch_from_api(ticker, time_from=time_from)
+        except NewsFetchError as e:
+            # back off so a capped key set isn't walked again on every request
+            _record_failed_fetch(feed_key)
+            # we already have articles for this feed, stale beats nothing
+            if has_articles:
+                print(f"[WARN] Refresh of {feed_key} failed, serving stored articles: {e}")
+                return True
+            raise
+
+        conn = get_db_connection()
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    latest = _store_articles(cur, feed)
+                    if time_from and (latest is None or latest < time_from):
+                        latest = time_from
+                    cur.execute(
+                        """
+                        INSERT INTO news_feeds (feed_key, last_fetched, latest_published)
+                        VALUES (%s, NOW(), %s)
+                        ON CONFLICT (feed_key) DO UPDATE SET
+                            last_fetched = EXCLUDED.last_fetched,
+                            latest_published = EXCLUDED.latest_published
+                        """,
+                        (feed_key, latest),
+                    )
+        finally:
+            conn.close()
+        return True
+
+def _record_failed_fetch(feed_key: str):
+    # date last_fetched so the feed turns stale again RETRY_AFTER_FAIL_SEC from now
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO news_feeds (feed_key, last_fetched)
+                    VALUES (%s, NOW() - make_interval(secs => %s))
+                    ON CONFLICT (feed_key) DO UPDATE SET
+                        last_fetched = EXCLUDED.last_fetched
+                    """,
+                    (feed_key, CACHE_TTL_SEC - RETRY_AFTER_FAIL_SEC),
+                )
+    finally:
+        conn.close()
+
+def _query_articles(tickers: List[str], limit: int, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+    # reads a page of articles from the ticker index (or the general topic index)
+    if tickers:
+        where = "EXISTS (SELECT 1 FROM news_article_tickers t WHERE t.url = a.url AND t.ticker = ANY(%s))"
+        arg = tickers
+    else:
+        where = "EXISTS (SELECT 1 FROM news_article_topics t WHERE t.url = a.url AND t.topic = %s)"
+        arg = GENERAL_TOPIC
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT a.url, a.title, a.summary, a.source, a.banner_image,
+                       a.time_published, a.overall_sentiment_score,
+                       a.overall_sentiment_label, COUNT(*) OVER () AS total
+                FROM news_articles a
+                WHERE {where}
+                ORDER BY a.time_published DESC NULLS LAST, a.url
+                LIMIT %s OFFSET %s
+                """,
+                (arg, limit, offset),
+            )
+            rows = cur.fetchall()
+            urls = [r["url"] for r in rows]
+
+            ticker_rows, topic_rows = [], []
+            if urls:
+                cur.execute(
+                    """
+                    SELECT url, ticker, relevance_score, sentiment_score, sentiment_label
+                    FROM news_article_tickers WHERE url = ANY(%s)
+                    ORDER BY relevance_score DESC NULLS LAST
+                    """,
+                    (urls,),
+                )
+                ticker_rows = cur.fetchall()
+                cur.execute(
+                    "SELECT url, topic, relevance_score FROM news_article_topics WHERE url = ANY(%s)",
+                    (urls,),
+                )
+                topic_rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    # when offset runs past the end there are no rows to carry the window count
+    total = rows[0]["total"] if rows else 0
+
+    by_url: Dict[str, Dict[str, Any]] = {}
+    articles = []
+    for r in rows:
+        article = {
+            "title": r["title"],
+            "summary": r["summary"],
+            "url": r["url"],
+            "source": r["source"],
+            "banner_image": r["banner_image"],
+            "time_published": r["time_published"],  # datetime, orjson encodes it
+            "sentiment": r["overall_sentiment_label"],
+            "sentiment_score": r["overall_sentiment_score"],
+            "ticker_sentiment": [],
+            "topics": [],
+        }
+        by_url[r["url"]] = article
+        articles.append(article)
+
+    for t in ticker_rows:
+        by_url[t["url"]]["ticker_sentiment"].append({
+            "ticker": t["ticker"],
+            "relevance_score": t["relevance_score"],
+            "sentiment_score": t["sentiment_score"],
+            "sentiment": t["sentiment_label"],
+        })
+    for t in topic_rows:
+        by_url[t["url"]]["topics"].append({
+            "topic": t["topic"],
+            "relevance_score": t["relevance_score"],
+        })
+
+    return articles, total
+
+def get_news(tickers: Optional[List[str]] = None,
+             limit: int = 10,
+             offset: int = 0) -> Dict[str, Any]:
+    # refresh stale feeds (at most MAX_REFRESH_PER_REQUEST upstream calls), then
+    # serve the page from the store. tickers left stale are picked up by later requests
+    tickers = sorted({_normalize_ticker(t) for t in tickers or [] if t.strip()})
+    if len(tickers) > MAX_TICKERS:
+        raise ValueError(f"at most {MAX_TICKERS} tickers per request")
+
+    calls = 0
+    last_err = None
+    for t in tickers or [None]:
+        if calls >= MAX_REFRESH_PER_REQUEST:
+            print("[INFO] refresh budget spent, serving remaining feeds from store")
+            break
+        try:
+            if _refresh_feed(t):
+                calls += 1
+        except NewsFetchError as e:
+            # one never-fetched feed failing shouldn't sink the others
+            calls += 1
+            last_err = e
 
-    payload = _fetch_from_api(ticker)
-    _cache[cache_key] = (datetime.utcnow(), payload)
-    return payload
+    articles, total = _query_articles(tickers, limit, offset)
+    if last_err and not total:
+        raise last_err
+    return {"articles": articles, "total": total, "limit": limit, "offset": offset}
@@ -1,5 +1,5 @@
 # server/auth.py
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel
 import bcrypt
 
@@ -8,6 +8,13 @@ from server.database import get_db_connection
 router = APIRouter()
 
 
+def get_session_user(request: Request):
+    username = request.cookies.get("session_user")
+    if not username:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return username
+
+
 class RegisterRequest(BaseModel):
     username: str
     password: str
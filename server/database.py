@@ -46,5 +46,91 @@ def init_db():
                     )
                     """
                 )
+
+                # portfolio holdings, one row per position
+                cursor.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS holdings (
+                        id SERIAL PRIMARY KEY,
+                        username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+                        ticker TEXT NOT NULL,
+                        shares DOUBLE PRECISION NOT NULL,
+                        avg_cost DOUBLE PRECISION,
+                        UNIQUE (username, ticker)
+                    )
+                    """
+                )
+
+                # news store, one row per article url
+                cursor.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS news_articles (
+                        url TEXT PRIMARY KEY,
+                        title TEXT,
+                        summary TEXT,
+                        source TEXT,
+                        banner_image TEXT,
+                        time_published TIMESTAMP,
+                        overall_sentiment_score DOUBLE PRECISION,
+                        overall_sentiment_label TEXT,
+                        fetched_at TIMESTAMP NOT NULL DEFAULT NOW()
+                    )
+                    """
+                )
+                cursor.execute(
+                    """
+                    CREATE INDEX IF NOT EXISTS news_articles_published_idx
+                    ON news_articles (time_published DESC)
+                    """
+                )
+
+                # per ticker index, keeps the ticker sentiment AV sends along
+                cursor.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS news_article_tickers (
+                        url TEXT NOT NULL REFERENCES news_articles(url) ON DELETE CASCADE,
+                        ticker TEXT NOT NULL,
+                        relevance_score DOUBLE PRECISION,
+                        sentiment_score DOUBLE PRECISION,
+                        sentiment_label TEXT,
+                        PRIMARY KEY (url, ticker)
+                    )
+                    """
+                )
+                cursor.execute(
+                    """
+                    CREATE INDEX IF NOT EXISTS news_article_tickers_ticker_idx
+                    ON news_article_tickers (ticker)
+                    """
+                )
+
+                # per topic index (general feed reads from 'financial_markets')
+                cursor.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS news_article_topics (
+                        url TEXT NOT NULL REFERENCES news_articles(url) ON DELETE CASCADE,
+                        topic TEXT NOT NULL,
+                        relevance_score DOUBLE PRECISION,
+                        PRIMARY KEY (url, topic)
+                    )
+                    """
+                )
+                cursor.execute(
+                    """
+                    CREATE INDEX IF NOT EXISTS news_article_topics_topic_idx
+                    ON news_article_topics (topic)
+                    """
+                )
+
+                # when each upstream feed was last pulled, drives time_from
+                cursor.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS news_feeds (
+                        feed_key TEXT PRIMARY KEY,
+                        last_fetched TIMESTAMP NOT NULL,
+                        latest_published TIMESTAMP
+                    )
+                    """
+                )
     finally:
         conn.close()
@@ -1,12 +1,16 @@
 import os
-from fastapi import FastAPI, HTTPException, Query
+import orjson
+from datetime import datetime
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from fastapi.responses import ORJSONResponse
+from typing import Dict, Optional, Tuple
 from server.auth import router as auth_router
 from server.database import init_db
-from server.api_data_fetch import get_prices
-from server.api_news_fetch import get_news
+from server.api_data_fetch import cached_stamp, get_prices_with_stamp
+from server.api_news_fetch import NewsFetchError, get_news
 from server.watchlist import router as watchlist_router
+from server.portfolio import router as portfolio_router
 
 
 app = FastAPI()
@@ -47,17 +51,16 @@ def startup_event():
 
 app.include_router(auth_router)
 app.include_router(watchlist_router)
+app.include_router(portfolio_router)
 
-def json_safe(d):
-    meta, rows = d["meta"], d["rows"]
-    out_rows = []
-    for r in rows:
-        r = dict(r)
-        ts = r.get("timestamp")
-        if hasattr(ts, "isoformat"):
-            r["timestamp"] = ts.isoformat()
-        out_rows.append(r)
-    return {"meta": meta, "rows": out_rows}
+# encoded /prices bodies, reused as-is until the cached series behind them refreshes
+_prices_body: Dict[Tuple[str, str, Optional[str]], Tuple[datetime, bytes]] = {}
+
+def _prune_prices_body():
+    # drop bodies whose cached payload expired or was replaced, they go with the cache
+    for key, (stamp, _) in list(_prices_body.items()):
+        if cached_stamp(*key) != stamp:
+            _prices_body.pop(key, None)
 
 @app.get("/prices")
 def prices(
@@ -65,12 +68,35 @@ def prices(
     symbol: str = Query(..., min_length=1),
     interval: Optional[str] = None
 ):
+    key = (function, symbol, interval)
+    stamp = cached_stamp(function, symbol, interval)
+    hit = _prices_body.get(key)
+    if hit and stamp is not None and hit[0] == stamp:
+        return Response(content=hit[1], media_type="application/json")
+
+    _prune_prices_body()
+
     try:
-        data = get_prices(function=function, symbol=symbol, interval=interval)
-        return json_safe(data)
+        stamp, data = get_prices_with_stamp(function=function, symbol=symbol, interval=interval)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    # orjson writes the datetime timestamps natively, no per-row copy needed
+    body = orjson.dumps(data)
+    if cached_stamp(*key) == stamp:
+        _prices_body[key] = (stamp, body)
+    return Response(content=body, media_type="application/json")
+
 @app.get("/api/news")
-def news(ticker: str = Query(None)):
-    return {"articles": get_news(ticker)}
+def news(
+    ticker: Optional[str] = Query(None, description="one ticker or a comma separated list"),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    tickers = ticker.split(",") if ticker else []
+    try:
+        return ORJSONResponse(get_news(tickers, limit=limit, offset=offset))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NewsFetchError as e:
+        raise HTTPException(status_code=502, detail=str(e))
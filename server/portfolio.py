@@ -0,0 +1,301 @@
+# server/portfolio.py
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+from server.api_data_fetch import get_prices_with_stamp
+from server.auth import get_session_user
+from server.database import get_db_connection
+
+router = APIRouter()
+
+SERIES_FUNCTION = "TIME_SERIES_DAILY"
+# daily bars only move once a day, so the portfolio keeps its own arrays far
+# longer than the 120s price cache instead of going back upstream per symbol
+SERIES_TTL_SEC = 6 * 3600
+RETRY_AFTER_FAIL_SEC = 300  # after a symbol's refresh fails, serve last known bars this long
+
+# symbol -> (fetched_at, dates, closes)
+_series_memo: Dict[str, Tuple[datetime, np.ndarray, np.ndarray]] = {}
+# symbol -> utc time of its last failed refresh
+_series_failed: Dict[str, datetime] = {}
+# username -> (signature, valuation), signature = holdings + fetch stamps of every series
+_valuation_memo: Dict[str, Tuple[tuple, Dict[str, Any]]] = {}
+
+
+class HoldingItem(BaseModel):
+    ticker: str
+    shares: float
+    avg_cost: Optional[float] = None
+
+
+def _load_holdings(username: str) -> List[Tuple[str, float, Optional[float]]]:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT ticker, shares, avg_cost FROM holdings WHERE username = %s ORDER BY ticker ASC",
+                (username,),
+            )
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+    return [(r["ticker"], r["shares"], r["avg_cost"]) for r in rows]
+
+
+def _fresh_stamp(symbol: str) -> Optional[datetime]:
+    # fetch stamp of a memoized series still inside SERIES_TTL_SEC, else None
+    hit = _series_memo.get(symbol)
+    if hit and datetime.utcnow() - hit[0] < timedelta(seconds=SERIES_TTL_SEC):
+        return hit[0]
+    return None
+
+
+def _daily_series(symbol: str) -> Tuple[datetime, np.ndarray, np.ndarray]:
+    # (fetched_at, dates, closes) for a symbol, only going upstream once the arrays expire
+    hit = _series_memo.get(symbol)
+    if hit and _fresh_stamp(symbol) is not None:
+        return hit
+
+    # a recent failure means AV is likely capped, don't walk every key again yet
+    failed = _series_failed.get(symbol)
+    if failed and datetime.utcnow() - failed < timedelta(seconds=RETRY_AFTER_FAIL_SEC):
+        if hit:
+            return hit
+        raise RuntimeError(f"refresh of {symbol} failed recently, retrying later")
+
+    try:
+        stamp, data = get_prices_with_stamp(function=SERIES_FUNCTION, symbol=symbol)
+    except Exception as e:
+        _series_failed[symbol] = datetime.utcnow()
+        # last known bars beat dropping the position
+        if hit:
+            print(f"[WARN] portfolio: refresh of {symbol} failed, using last known series: {e}")
+            return hit
+        raise
+    _series_failed.pop(symbol, None)
+
+    rows = [r for r in data["rows"] if isinstance(r["timestamp"], datetime)]
+    dates = np.array([r["timestamp"] for r in rows], dtype="datetime64[D]")
+    closes = np.array([r["close"] for r in rows], dtype=float)
+    keep = np.isfinite(closes)
+    entry = (stamp, dates[keep], closes[keep])
+    _series_memo[symbol] = entry
+    return entry
+
+
+def _to_list(arr: np.ndarray) -> List[Optional[float]]:
+    # numpy -> json friendly floats, nan/inf become null
+    return [float(x) if np.isfinite(x) else None for x in arr]
+
+
+def _to_float(x) -> Optional[float]:
+    return float(x) if np.isfinite(x) else None
+
+
+def _empty_valuation() -> Dict[str, Any]:
+    # same keys as _value_portfolio, for portfolios with nothing to value
+    return {
+        "as_of": None,
+        "total_value": 0.0,
+        "day_pnl": 0.0,
+        "day_return": None,
+        "period_return": None,
+        "cost_basis": None,
+        "unrealized_pnl": None,
+        "max_drawdown": None,
+        "current_drawdown": None,
+        "positions": [],
+        "series": {"dates": [], "value": [], "daily_pnl": [], "returns": [], "drawdown": []},
+    }
+
+
+def _value_portfolio(symbols: List[str],
+                     shares: np.ndarray,
+                     avg_cost: np.ndarray,
+                     series: List[Tuple[np.ndarray, np.ndarray]]) -> Dict[str, Any]:
+    # aligns every held series onto one date axis, then values all positions at once
+
+    # start where every symbol has a price so the total is comparable day to day
+    start = max(d[0] for d, _ in series)
+    dates = np.unique(np.concatenate([d for d, _ in series]))
+    dates = dates[dates >= start]
+
+    # (n_dates, n_symbols) close matrix, forward filled over each symbol's gaps
+    closes = np.empty((len(dates), len(symbols)))
+    for j, (d, c) in enumerate(series):
+        closes[:, j] = c[np.searchsorted(d, dates, side="right") - 1]
+
+    values = closes * shares
+    total = values.sum(axis=1)
+    daily_pnl = np.diff(total, prepend=total[0])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.concatenate(([0.0], total[1:] / total[:-1] - 1.0))
+        peak = np.maximum.accumulate(total)
+        drawdown = total / peak - 1.0
+
+        last = closes[-1]
+        prev = closes[-2] if len(dates) > 1 else closes[-1]
+        market_value = values[-1]
+        cost_basis = avg_cost * shares
+        unrealized = market_value - cost_basis
+        weight = market_value / total[-1]
+        day_change = (last - prev) * shares
+        day_return = last / prev - 1.0
+
+        has_cost = np.isfinite(cost_basis)
+        total_cost = cost_basis[has_cost].sum() if has_cost.any() else np.nan
+        total_unrealized = unrealized[has_cost].sum() if has_cost.any() else np.nan
+
+    positions = [
+        {
+            "ticker": sym,
+            "shares": float(shares[j]),
+            "avg_cost": _to_float(avg_cost[j]),
+            "last_close": float(last[j]),
+            "market_value": float(market_value[j]),
+            "cost_basis": _to_float(cost_basis[j]),
+            "unrealized_pnl": _to_float(unrealized[j]),
+            "day_change": float(day_change[j]),
+            "day_return": _to_float(day_return[j]),
+            "weight": _to_float(weight[j]),
+        }
+        for j, sym in enumerate(symbols)
+    ]
+
+    return {
+        "as_of": str(dates[-1]),
+        "total_value": float(total[-1]),
+        "day_pnl": float(daily_pnl[-1]),
+        "day_return": _to_float(returns[-1]),
+        "period_return": _to_float(total[-1] / total[0] - 1.0) if total[0] else None,
+        "cost_basis": _to_float(total_cost),
+        "unrealized_pnl": _to_float(total_unrealized),
+        "max_drawdown": _to_float(np.nanmin(drawdown)),
+        "current_drawdown": _to_float(drawdown[-1]),
+        "positions": positions,
+        "series": {
+            "dates": [str(d) for d in dates],
+            "value": _to_list(total),
+            "daily_pnl": _to_list(daily_pnl),
+            "returns": _to_list(returns),
+            "drawdown": _to_list(drawdown),
+        },
+    }
+
+
+def get_portfolio(username: str) -> Dict[str, Any]:
+    holdings = _load_holdings(username)
+    if not holdings:
+        return {"username": username, **_empty_valuation(), "missing": []}
+
+    # fresh series + unchanged holdings -> nothing to recompute
+    stamps = tuple(_fresh_stamp(t) for t, _, _ in holdings)
+    signature = (tuple(holdings), stamps)
+    hit = _valuation_memo.get(username)
+    if hit and None not in stamps and hit[0] == signature:
+        return hit[1]
+
+    symbols, share_list, cost_list, series, missing = [], [], [], [], []
+    fetched = []
+    for ticker, qty, cost in holdings:
+        try:
+            stamp, dates, closes = _daily_series(ticker)
+        except Exception as e:
+            print(f"[WARN] portfolio: no daily series for {ticker}: {e}")
+            missing.append(ticker)
+            continue
+        if not len(dates):
+            missing.append(ticker)
+            continue
+        symbols.append(ticker)
+        share_list.append(qty)
+        cost_list.append(np.nan if cost is None else cost)
+        series.append((dates, closes))
+        fetched.append(stamp)
+
+    if not symbols:
+        result = _empty_valuation()
+    else:
+        result = _value_portfolio(
+            symbols,
+            np.array(share_list, dtype=float),
+            np.array(cost_list, dtype=float),
+            series,
+        )
+    result = {"username": username, **result, "missing": missing}
+
+    # only memoize complete valuations, a missing symbol should be retried next time
+    if not missing:
+        _valuation_memo[username] = ((tuple(holdings), tuple(fetched)), result)
+    return result
+
+
+@router.post("/portfolio")
+async def upsert_holding(request: Request, item: HoldingItem):
+    username = get_session_user(request).strip()
+    ticker = item.ticker.strip().upper()
+
+    if not ticker:
+        raise HTTPException(status_code=400, detail="Ticker required")
+    if not math.isfinite(item.shares) or item.shares <= 0:
+        raise HTTPException(status_code=400, detail="Shares must be a positive number")
+    if item.avg_cost is not None and (not math.isfinite(item.avg_cost) or item.avg_cost < 0):
+        raise HTTPException(status_code=400, detail="Average cost must be a non-negative number")
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                # Verify user exists
+                cur.execute("SELECT 1 FROM users WHERE username = %s", (username,))
+                if not cur.fetchone():
+                    raise HTTPException(status_code=404, detail="User not found")
+
+                cur.execute(
+                    """
+                    INSERT INTO holdings (username, ticker, shares, avg_cost)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (username, ticker)
+                    DO UPDATE SET shares = EXCLUDED.shares, avg_cost = EXCLUDED.avg_cost
+                    """,
+                    (username, ticker, item.shares, item.avg_cost),
+                )
+    finally:
+        conn.close()
+
+    return {"message": f"{ticker} saved to {username}'s portfolio"}
+
+
+@router.get("/portfolio")
+def portfolio(request: Request):
+    # plain def: valuation may call upstream for cold series, keep it off the event loop
+    username = get_session_user(request)
+    return ORJSONResponse(get_portfolio(username))
+
+
+@router.delete("/portfolio/{ticker}")
+async def remove_holding(request: Request, ticker: str):
+    username = get_session_user(request)
+    ticker = ticker.upper()
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM holdings WHERE username = %s AND ticker = %s",
+                    (username, ticker),
+                )
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="Ticker not found in portfolio")
+    finally:
+        conn.close()
+
+    return {"message": f"{ticker} removed from {username}'s portfolio"}
@@ -1,6 +1,7 @@
 # server/watchlist.py
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
+from server.auth import get_session_user
 from server.database import get_db_connection
 
 router = APIRouter()
@@ -10,16 +11,9 @@ class WatchlistItem(BaseModel):
     ticker: str
 
 
-def _get_session_user(request: Request):
-    username = request.cookies.get("session_user")
-    if not username:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    return username
-
-
 @router.post("/watchlist")
 async def add_to_watchlist(request: Request, item: WatchlistItem):
-    username = _get_session_user(request).strip()
+    username = get_session_user(request).strip()
     ticker = item.ticker.strip().upper()
 
     if not ticker:
@@ -51,7 +45,7 @@ async def add_to_watchlist(request: Request, item: WatchlistItem):
 
 @router.get("/watchlist")
 async def get_watchlist(request: Request):
-    username = _get_session_user(request)
+    username = get_session_user(request)
 
     conn = get_db_connection()
     try:
@@ -69,7 +63,7 @@ async def get_watchlist(request: Request):
 
 @router.delete("/watchlist/{ticker}")
 async def remove_from_watchlist(request: Request, ticker: str):
-    username = _get_session_user(request)
+    username = get_session_user(request)
     ticker = ticker.upper()
 
     conn = get_db_connection()